@@ -3,8 +3,27 @@ import yfinance as yf
 import pandas as pd
 import plotly.graph_objects as go
 import plotly.express as px
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 import numpy as np
+import hashlib
+import html
+import math
+import os
+import threading
+import time
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+    # Fall back to plain Python when numba is not installed
+    def njit(*args, **kwargs):
+        if args and callable(args[0]):
+            return args[0]
+        return lambda func: func
 
 # Page configuration
 st.set_page_config(
@@ -14,6 +33,11 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Re-assign widget state owned by sections that may not render this run, so Streamlit
+# keeps it instead of discarding it while another section is shown
+if "selected_stock" in st.session_state:
+    st.session_state["selected_stock"] = st.session_state["selected_stock"]
+
 # Custom CSS for better styling
 st.markdown("""
     <style>
@@ -30,6 +54,23 @@ st.markdown("""
         border-radius: 0.5rem;
         margin: 0.5rem 0;
     }
+    .metric-card h3 {
+        margin: 0 0 0.5rem 0;
+    }
+    .metric-label {
+        font-size: 0.875rem;
+        color: #555;
+        margin-top: 0.5rem;
+    }
+    .metric-value {
+        font-size: 1.75rem;
+    }
+    .metric-delta-up {
+        color: #09ab3b;
+    }
+    .metric-delta-down {
+        color: #ff2b2b;
+    }
     </style>
 """, unsafe_allow_html=True)
 
@@ -67,22 +108,77 @@ with st.sidebar:
         "5Y": 1825
     }
     
-    end_date = datetime.now()
-    start_date = end_date - timedelta(days=period_map[time_period])
+    # Use calendar dates so cache keys stay stable across reruns within a day;
+    # yfinance treats end as exclusive, so end tomorrow to include today's bar
+    today = datetime.now().date()
+    end_date = today + timedelta(days=1)
+    start_date = today - timedelta(days=period_map[time_period])
     
     # Portfolio allocation
     st.subheader("Portfolio Allocation")
     st.info("Equal weight allocation is used by default")
 
+# On-disk cache shared across sessions and restarts, kept next to this script.
+# Cached files are unpickled, so the directory must not be writable by other users.
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+CACHE_TTL = 3600
+
+# Maximum number of points sent to the browser per line trace
+MAX_PLOT_POINTS = 1000
+
+# Function to delete on-disk cache files (and leftover temporary files) older than the TTL
+def prune_disk_cache():
+    now = time.time()
+    for name in os.listdir(CACHE_DIR):
+        if not name.endswith((".pkl", ".tmp")):
+            continue
+        path = os.path.join(CACHE_DIR, name)
+        try:
+            if now - os.path.getmtime(path) >= CACHE_TTL:
+                os.remove(path)
+        except OSError:
+            pass  # Already removed by another session
+
+# Function to download data, reusing a recent on-disk copy when available
+def cached_download(tickers, start, end, **kwargs):
+    key = hashlib.md5(f"{tickers}|{start}|{end}|{sorted(kwargs.items())}".encode()).hexdigest()
+    path = os.path.join(CACHE_DIR, f"{key}.pkl")
+    
+    if os.path.exists(path):
+        try:
+            if time.time() - os.path.getmtime(path) < CACHE_TTL:
+                return pd.read_pickle(path)
+            os.remove(path)  # Expired
+        except Exception:
+            pass  # Corrupt, incompatible or concurrently removed file, fetch again
+    
+    df = yf.download(tickers, start=start, end=end, **kwargs)
+    
+    if not df.empty:
+        # Write to a temporary file first so readers never see a partial pickle
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            prune_disk_cache()
+            df.to_pickle(tmp_path)
+            os.replace(tmp_path, path)
+        except OSError:
+            # Read-only or full filesystem, rely on the in-memory cache only
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+    return df
+
 # Function to fetch stock data
-@st.cache_data(ttl=3600)
+@st.cache_data(ttl=CACHE_TTL)
 def fetch_stock_data(ticker, start, end):
     try:
         # Use download method which is more reliable in cloud environments
-        df = yf.download(
+        df = cached_download(
             ticker, 
-            start=start, 
-            end=end, 
+            start, 
+            end, 
             progress=False,
             auto_adjust=True
         )
@@ -104,33 +200,178 @@ def fetch_stock_data(ticker, start, end):
         st.error(f"Error fetching data for {ticker}: {str(e)}")
         return None
 
+# Function to fetch all tickers in a single request
+@st.cache_data(ttl=CACHE_TTL)
+def fetch_batch_stock_data(tickers, start, end):
+    try:
+        df_all = cached_download(
+            list(tickers),
+            start,
+            end,
+            group_by='ticker',
+            progress=False,
+            auto_adjust=True,
+            threads=True
+        )
+    except Exception as e:
+        st.error(f"Error fetching data for {', '.join(tickers)}: {str(e)}")
+        return {}
+    
+    if df_all.empty:
+        return {}
+    
+    # Older yfinance versions return flat columns for a single ticker
+    if not isinstance(df_all.columns, pd.MultiIndex):
+        return {tickers[0]: df_all} if len(tickers) == 1 else {}
+    
+    batch_data = {}
+    available = set(df_all.columns.get_level_values(0))
+    for ticker in tickers:
+        if ticker in available:
+            df = df_all[ticker].dropna(how='all')
+            if not df.empty:
+                batch_data[ticker] = df
+    return batch_data
+
+# Fused drawdown / volatility / Sharpe kernel over a daily returns array
+@njit(cache=True)
+def return_stats_nb(returns, risk_free_daily, periods):
+    n = returns.size
+    wealth = 1.0
+    peak = 1.0
+    max_drawdown = 0.0
+    total = 0.0
+    total_sq = 0.0
+    
+    for i in range(n):
+        r = returns[i]
+        wealth *= 1.0 + r
+        if wealth > peak:
+            peak = wealth
+        drawdown = wealth / peak - 1.0
+        if drawdown < max_drawdown:
+            max_drawdown = drawdown
+        total += r
+        total_sq += r * r
+    
+    if n < 2:
+        return max_drawdown, 0.0, 0.0
+    
+    # Sample standard deviation (ddof=1) to match pandas
+    mean = total / n
+    variance = (total_sq - n * mean * mean) / (n - 1)
+    std = math.sqrt(variance) if variance > 0 else 0.0
+    sharpe = (mean - risk_free_daily) / std * math.sqrt(periods) if std > 0 else 0.0
+    return max_drawdown, std, sharpe
+
+# Vectorized equivalent of return_stats_nb for when numba is not installed
+def return_stats_np(returns, risk_free_daily, periods):
+    if returns.size == 0:
+        return 0.0, 0.0, 0.0
+    
+    # Running peak via np.maximum.accumulate, starting from an initial wealth of 1
+    wealth = np.cumprod(1.0 + returns)
+    peak = np.maximum.accumulate(np.maximum(wealth, 1.0))
+    max_drawdown = min((wealth / peak - 1.0).min(), 0.0)
+    
+    if returns.size < 2:
+        return max_drawdown, 0.0, 0.0
+    
+    std = returns.std(ddof=1)
+    sharpe = (returns.mean() - risk_free_daily) / std * np.sqrt(periods) if std > 0 else 0.0
+    return max_drawdown, std, sharpe
+
+return_stats = return_stats_nb if NUMBA_AVAILABLE else return_stats_np
+
+# Largest-Triangle-Three-Buckets selection of the rows that best preserve the shape of
+# every column of y (n_rows x n_series); triangle areas are summed across series, NaNs skipped
+@njit(cache=True)
+def lttb_indices_nb(y, n_out):
+    n, k = y.shape
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    
+    indices = np.empty(n_out, dtype=np.int64)
+    indices[0] = 0
+    indices[n_out - 1] = n - 1
+    bucket_size = (n - 2) / (n_out - 2)
+    avg_y = np.empty(k)
+    a = 0
+    
+    for i in range(n_out - 2):
+        start = int(math.floor(i * bucket_size)) + 1
+        end = int(math.floor((i + 1) * bucket_size)) + 1
+        next_end = min(int(math.floor((i + 2) * bucket_size)) + 1, n)
+        
+        # Average point of the next bucket, per series
+        avg_x = 0.5 * (end + next_end - 1)
+        for c in range(k):
+            total = 0.0
+            count = 0
+            for j in range(end, next_end):
+                if not np.isnan(y[j, c]):
+                    total += y[j, c]
+                    count += 1
+            avg_y[c] = total / count if count > 0 else np.nan
+        
+        # Keep the row forming the largest triangles with the previous pick and the next averages
+        max_area = -1.0
+        chosen = start
+        for j in range(start, end):
+            area = 0.0
+            for c in range(k):
+                triangle = abs((a - avg_x) * (y[j, c] - y[a, c]) - (a - j) * (avg_y[c] - y[a, c]))
+                if not np.isnan(triangle):
+                    area += triangle
+            if area > max_area:
+                max_area = area
+                chosen = j
+        indices[i + 1] = chosen
+        a = chosen
+    
+    return indices
+
+# Function to pick the rows kept when plotting; share the result across a figure's traces
+# so that every trace is sampled on the same dates
+def downsample_indices(values, max_points=MAX_PLOT_POINTS):
+    values = np.asarray(values, dtype=np.float64)
+    if values.ndim == 1:
+        values = values.reshape(-1, 1)
+    if values.shape[0] <= max_points:
+        return np.arange(values.shape[0])
+    return lttb_indices_nb(values, max_points)
+
+# Function to take the sampled points of a series for plotting
+def sampled_values(series, indices):
+    # float32 is ample for plotting; plotly >= 6 sends arrays as typed binary buffers,
+    # so this halves the payload sent to the browser
+    return series.to_numpy(dtype=np.float32)[indices]
+
 # Function to calculate metrics
-def calculate_metrics(df):
+def calculate_metrics(df, daily_returns=None):
     if df is None or df.empty:
         return None
     
     try:
-        current_price = df['Close'].iloc[-1]
-        start_price = df['Close'].iloc[0]
-        
+        # Work on a plain float64 array to avoid intermediate pandas Series
+        close = df['Close'].to_numpy(dtype=np.float64)
+        close = close[~np.isnan(close)]
+        current_price = close[-1]
+        start_price = close[0]
+
         # Returns
         total_return = ((current_price - start_price) / start_price) * 100
-        daily_returns = df['Close'].pct_change().dropna()
-        
-        # Volatility (annualized)
-        volatility = daily_returns.std() * np.sqrt(252) * 100
-        
-        # Sharpe Ratio (assuming 2% risk-free rate)
+        if daily_returns is None:
+            daily_returns = np.diff(close) / close[:-1]
+        else:
+            daily_returns = np.asarray(daily_returns, dtype=np.float64)
+
+        # Max Drawdown, Volatility and Sharpe Ratio (assuming 2% risk-free rate)
         risk_free_rate = 0.02
-        excess_returns = daily_returns - (risk_free_rate / 252)
-        sharpe_ratio = (excess_returns.mean() / daily_returns.std()) * np.sqrt(252) if daily_returns.std() != 0 else 0
-        
-        # Max Drawdown
-        cumulative = (1 + daily_returns).cumprod()
-        running_max = cumulative.expanding().max()
-        drawdown = (cumulative - running_max) / running_max
-        max_drawdown = drawdown.min() * 100
-        
+        max_drawdown, returns_std, sharpe_ratio = return_stats(daily_returns, risk_free_rate / 252, 252)
+        volatility = returns_std * np.sqrt(252) * 100
+        max_drawdown *= 100
+
         return {
             "current_price": current_price,
             "total_return": total_return,
@@ -143,29 +384,94 @@ def calculate_metrics(df):
         return None
 
 # Main content
-tabs = st.tabs(["📊 Overview", "📈 Performance", "🎯 Portfolio Analysis", "📉 Risk Metrics"])
+# Only the selected section is computed and rendered on each rerun (st.tabs runs every tab)
+tabs = ["📊 Overview", "📈 Performance", "🎯 Portfolio Analysis", "📉 Risk Metrics"]
+active_tab = st.radio(
+    "Section",
+    tabs,
+    horizontal=True,
+    label_visibility="collapsed",
+    key="active_tab"
+)
 
 # Fetch data for all stocks with progress indicator
 if not selected_stocks:
     st.warning("Please enter at least one stock ticker.")
     st.stop()
 
-stock_data = {}
-progress_bar = st.progress(0)
+with st.spinner(f"Fetching data for {len(selected_stocks)} ticker(s)..."):
+    fetched_data = dict(fetch_batch_stock_data(tuple(selected_stocks), start_date, end_date))
+
+# Retry tickers missing from the batch individually for per-ticker error reporting
+missing_stocks = [ticker for ticker in selected_stocks if ticker not in fetched_data]
+
+progress_bar = st.progress(0) if missing_stocks else None
 status_text = st.empty()
 
-for idx, ticker in enumerate(selected_stocks):
-    status_text.text(f"Fetching data for {ticker}... ({idx + 1}/{len(selected_stocks)})")
-    data = fetch_stock_data(ticker, start_date, end_date)
-    if data is not None and not data.empty:
-        stock_data[ticker] = data
-    progress_bar.progress((idx + 1) / len(selected_stocks))
+if missing_stocks:
+    status_text.text(f"Fetching data for {len(missing_stocks)} ticker(s) individually...")
+    
+    # Fetch concurrently; worker threads share the script context so st.error still renders.
+    # Concurrent yf.download calls need yfinance >= 1.4, which keeps download state per call.
+    with ThreadPoolExecutor(
+        max_workers=min(16, len(missing_stocks)),
+        initializer=add_script_run_ctx,
+        initargs=(None, get_script_run_ctx())
+    ) as executor:
+        futures = {
+            executor.submit(fetch_stock_data, ticker, start_date, end_date): ticker
+            for ticker in missing_stocks
+        }
+        
+        # Results are collected and progress reported on the main thread only
+        for completed, future in enumerate(as_completed(futures), start=1):
+            ticker = futures[future]
+            data = future.result()
+            if data is not None and not data.empty:
+                fetched_data[ticker] = data
+            status_text.text(f"Fetched {ticker} ({completed}/{len(missing_stocks)})")
+            progress_bar.progress(completed / len(missing_stocks))
+
+# Preserve the order the tickers were entered in
+stock_data = {}
+for ticker in selected_stocks:
+    if ticker in fetched_data:
+        stock_data[ticker] = fetched_data[ticker]
 
-progress_bar.empty()
+if progress_bar is not None:
+    progress_bar.empty()
 status_text.empty()
 
+# Align all closes on one date index (forward-filling calendar gaps) for matrix operations
+if stock_data:
+    closes = pd.concat({ticker: df['Close'] for ticker, df in stock_data.items()}, axis=1).ffill()
+else:
+    closes = pd.DataFrame()
+
+# Compute daily returns and metrics once per ticker and reuse them across tabs
+returns_by_ticker = {ticker: df['Close'].dropna().pct_change().dropna() for ticker, df in stock_data.items()}
+metrics_by_ticker = {
+    ticker: calculate_metrics(df, returns_by_ticker[ticker]) for ticker, df in stock_data.items()
+}
+
+# Numeric metrics table shared by the risk table and the risk-return scatter
+metrics_df = pd.DataFrame(
+    [
+        {
+            "Ticker": ticker,
+            "Current Price": metrics['current_price'],
+            "Total Return": metrics['total_return'],
+            "Volatility": metrics['volatility'],
+            "Sharpe Ratio": metrics['sharpe_ratio'],
+            "Max Drawdown": metrics['max_drawdown']
+        }
+        for ticker, metrics in metrics_by_ticker.items() if metrics
+    ],
+    columns=["Ticker", "Current Price", "Total Return", "Volatility", "Sharpe Ratio", "Max Drawdown"]
+)
+
 # Tab 1: Overview
-with tabs[0]:
+if active_tab == tabs[0]:
     st.header("Market Overview")
     
     if not stock_data:
@@ -174,19 +480,26 @@ with tabs[0]:
         # Display metrics for each stock
         cols = st.columns(min(len(stock_data), 3))
         
-        for idx, (ticker, df) in enumerate(stock_data.items()):
+        for idx, ticker in enumerate(stock_data):
             col_idx = idx % 3
             with cols[col_idx]:
-                metrics = calculate_metrics(df)
+                metrics = metrics_by_ticker[ticker]
                 if metrics:
-                    st.subheader(ticker)
-                    st.metric(
-                        "Current Price",
-                        f"${metrics['current_price']:.2f}",
-                        f"{metrics['total_return']:.2f}%"
-                    )
-                    st.metric("Volatility", f"{metrics['volatility']:.2f}%")
-                    st.metric("Sharpe Ratio", f"{metrics['sharpe_ratio']:.2f}")
+                    # One HTML block per ticker instead of a subheader and three st.metric calls
+                    delta_class = "metric-delta-up" if metrics['total_return'] >= 0 else "metric-delta-down"
+                    delta_arrow = "▲" if metrics['total_return'] >= 0 else "▼"
+                    st.markdown(f"""
+                        <div class="metric-card">
+                            <h3>{html.escape(ticker)}</h3>
+                            <div class="metric-label">Current Price</div>
+                            <div class="metric-value">&#36;{metrics['current_price']:.2f}</div>
+                            <div class="{delta_class}">{delta_arrow} {metrics['total_return']:.2f}%</div>
+                            <div class="metric-label">Volatility</div>
+                            <div class="metric-value">{metrics['volatility']:.2f}%</div>
+                            <div class="metric-label">Sharpe Ratio</div>
+                            <div class="metric-value">{metrics['sharpe_ratio']:.2f}</div>
+                        </div>
+                    """, unsafe_allow_html=True)
         
         st.markdown("---")
         
@@ -194,11 +507,17 @@ with tabs[0]:
         st.subheader("Price Comparison (Normalized)")
         fig = go.Figure()
         
-        for ticker, df in stock_data.items():
-            normalized = (df['Close'] / df['Close'].iloc[0]) * 100
-            fig.add_trace(go.Scatter(
-                x=df.index,
-                y=normalized,
+        # Normalize every ticker to its first available close in one broadcast
+        normalized_all = closes.div(closes.bfill().iloc[0]).mul(100)
+        
+        # Sample every ticker on the same dates so the unified hover lines up
+        indices = downsample_indices(normalized_all.to_numpy(dtype=np.float64))
+        dates = normalized_all.index.values[indices]
+        
+        for ticker in normalized_all:
+            fig.add_trace(go.Scattergl(
+                x=dates,
+                y=sampled_values(normalized_all[ticker], indices),
                 mode='lines',
                 name=ticker,
                 line=dict(width=2)
@@ -216,11 +535,14 @@ with tabs[0]:
         st.plotly_chart(fig, use_container_width=True)
 
 # Tab 2: Performance
-with tabs[1]:
+if active_tab == tabs[1]:
     st.header("Individual Stock Performance")
     
     if stock_data:
-        selected_stock = st.selectbox("Select Stock", list(stock_data.keys()))
+        # Forget a previous pick that is no longer among the loaded tickers
+        if st.session_state.get("selected_stock") not in stock_data:
+            st.session_state.pop("selected_stock", None)
+        selected_stock = st.selectbox("Select Stock", list(stock_data.keys()), key="selected_stock")
         df = stock_data[selected_stock]
         
         col1, col2 = st.columns(2)
@@ -228,9 +550,10 @@ with tabs[1]:
         with col1:
             # Price chart
             fig_price = go.Figure()
-            fig_price.add_trace(go.Scatter(
-                x=df.index,
-                y=df['Close'],
+            indices = downsample_indices(df['Close'].to_numpy(dtype=np.float64))
+            fig_price.add_trace(go.Scattergl(
+                x=df.index.values[indices],
+                y=sampled_values(df['Close'], indices),
                 mode='lines',
                 name='Close Price',
                 line=dict(color='#2563eb', width=2)
@@ -247,12 +570,13 @@ with tabs[1]:
             st.plotly_chart(fig_price, use_container_width=True)
         
         with col2:
-            # Volume chart (if available)
-            if 'Volume' in df.columns:
+            # Volume chart (skipped when the volume column is missing or carries no data)
+            volume = df.get('Volume')
+            if volume is not None and volume.notna().any() and volume.sum() > 0:
                 fig_volume = go.Figure()
                 fig_volume.add_trace(go.Bar(
-                    x=df.index,
-                    y=df['Volume'],
+                    x=df.index.values,
+                    y=volume.values,
                     name='Volume',
                     marker_color='lightblue'
                 ))
@@ -269,16 +593,22 @@ with tabs[1]:
         
         # Daily returns distribution
         st.subheader("Daily Returns Distribution")
-        daily_returns = df['Close'].pct_change().dropna() * 100
+        daily_returns = returns_by_ticker[selected_stock].to_numpy() * 100
         
-        fig_dist = px.histogram(
-            daily_returns,
-            nbins=50,
-            title=f"{selected_stock} - Daily Returns Distribution",
-            labels={'value': 'Daily Return (%)', 'count': 'Frequency'}
-        )
+        # Bin with NumPy and draw plain bars rather than going through Plotly Express
+        counts, edges = np.histogram(daily_returns, bins=50)
+        fig_dist = go.Figure(go.Bar(
+            x=0.5 * (edges[:-1] + edges[1:]),
+            y=counts,
+            width=edges[1] - edges[0],
+            name='Daily Return'
+        ))
         
         fig_dist.update_layout(
+            title=f"{selected_stock} - Daily Returns Distribution",
+            xaxis_title="Daily Return (%)",
+            yaxis_title="Frequency",
+            bargap=0,
             showlegend=False,
             height=400,
             template="plotly_white"
@@ -287,15 +617,12 @@ with tabs[1]:
         st.plotly_chart(fig_dist, use_container_width=True)
 
 # Tab 3: Portfolio Analysis
-with tabs[2]:
+if active_tab == tabs[2]:
     st.header("Portfolio Analysis")
     
     if stock_data and len(stock_data) > 1:
-        # Calculate portfolio performance (equal weight)
-        portfolio_returns = pd.DataFrame()
-        
-        for ticker, df in stock_data.items():
-            portfolio_returns[ticker] = df['Close'].pct_change()
+        # Calculate portfolio performance (equal weight) on the aligned close matrix
+        portfolio_returns = closes.pct_change(fill_method=None)
         
         # Equal weight portfolio
         portfolio_returns['Portfolio'] = portfolio_returns.mean(axis=1)
@@ -304,10 +631,14 @@ with tabs[2]:
         # Portfolio value chart
         fig_portfolio = go.Figure()
         
+        # Sample every line on the same dates, chosen across all lines, so the unified hover lines up
+        indices = downsample_indices(cumulative_returns.to_numpy(dtype=np.float64))
+        dates = cumulative_returns.index.values[indices]
+        
         for col in cumulative_returns.columns:
-            fig_portfolio.add_trace(go.Scatter(
-                x=cumulative_returns.index,
-                y=cumulative_returns[col] * 100,
+            fig_portfolio.add_trace(go.Scattergl(
+                x=dates,
+                y=sampled_values(cumulative_returns[col] * 100, indices),
                 mode='lines',
                 name=col,
                 line=dict(width=3 if col == 'Portfolio' else 1.5)
@@ -330,16 +661,13 @@ with tabs[2]:
         
         portfolio_daily = portfolio_returns['Portfolio'].dropna()
         portfolio_total_return = (cumulative_returns['Portfolio'].iloc[-1] - 1) * 100
-        portfolio_volatility = portfolio_daily.std() * np.sqrt(252) * 100
         
         risk_free_rate = 0.02
-        excess_returns = portfolio_daily - (risk_free_rate / 252)
-        portfolio_sharpe = (excess_returns.mean() / portfolio_daily.std()) * np.sqrt(252) if portfolio_daily.std() != 0 else 0
-        
-        cumulative = (1 + portfolio_daily).cumprod()
-        running_max = cumulative.expanding().max()
-        drawdown = (cumulative - running_max) / running_max
-        portfolio_max_dd = drawdown.min() * 100
+        portfolio_max_dd, portfolio_std, portfolio_sharpe = return_stats(
+            portfolio_daily.to_numpy(dtype=np.float64), risk_free_rate / 252, 252
+        )
+        portfolio_volatility = portfolio_std * np.sqrt(252) * 100
+        portfolio_max_dd *= 100
         
         col1.metric("Total Return", f"{portfolio_total_return:.2f}%")
         col2.metric("Annualized Volatility", f"{portfolio_volatility:.2f}%")
@@ -348,7 +676,17 @@ with tabs[2]:
         
         # Correlation matrix
         st.subheader("Correlation Matrix")
-        correlation = portfolio_returns.drop('Portfolio', axis=1).corr()
+        # The first row is always empty after pct_change; use np.corrcoef only when no other
+        # row has gaps, otherwise keep pandas' pairwise-complete correlation
+        stock_returns = portfolio_returns.drop(columns='Portfolio').iloc[1:]
+        if stock_returns.notna().all().all():
+            correlation = pd.DataFrame(
+                np.corrcoef(stock_returns.to_numpy(dtype=np.float64), rowvar=False),
+                index=stock_returns.columns,
+                columns=stock_returns.columns
+            )
+        else:
+            correlation = stock_returns.corr()
         
         fig_corr = px.imshow(
             correlation,
@@ -366,51 +704,34 @@ with tabs[2]:
         st.warning("⚠️ No stock data available for portfolio analysis.")
 
 # Tab 4: Risk Metrics
-with tabs[3]:
+if active_tab == tabs[3]:
     st.header("Risk Analysis")
     
     if stock_data:
         # Risk metrics table
-        risk_data = []
-        
-        for ticker, df in stock_data.items():
-            metrics = calculate_metrics(df)
-            if metrics:
-                risk_data.append({
-                    "Ticker": ticker,
-                    "Current Price": f"${metrics['current_price']:.2f}",
-                    "Total Return": f"{metrics['total_return']:.2f}%",
-                    "Volatility": f"{metrics['volatility']:.2f}%",
-                    "Sharpe Ratio": f"{metrics['sharpe_ratio']:.2f}",
-                    "Max Drawdown": f"{metrics['max_drawdown']:.2f}%"
-                })
-        
-        if risk_data:
-            risk_df = pd.DataFrame(risk_data)
-            st.dataframe(risk_df, use_container_width=True, hide_index=True)
+        if not metrics_df.empty:
+            st.dataframe(
+                metrics_df.style.format({
+                    "Current Price": "${:.2f}",
+                    "Total Return": "{:.2f}%",
+                    "Volatility": "{:.2f}%",
+                    "Sharpe Ratio": "{:.2f}",
+                    "Max Drawdown": "{:.2f}%"
+                }),
+                use_container_width=True,
+                hide_index=True
+            )
             
             # Risk-Return scatter plot
             st.subheader("Risk-Return Profile")
             
-            scatter_data = []
-            for ticker, df in stock_data.items():
-                metrics = calculate_metrics(df)
-                if metrics:
-                    scatter_data.append({
-                        "Ticker": ticker,
-                        "Return": metrics['total_return'],
-                        "Volatility": metrics['volatility']
-                    })
-            
-            scatter_df = pd.DataFrame(scatter_data)
-            
             fig_scatter = px.scatter(
-                scatter_df,
+                metrics_df,
                 x='Volatility',
-                y='Return',
+                y='Total Return',
                 text='Ticker',
                 title="Risk-Return Profile",
-                labels={'Volatility': 'Volatility (%)', 'Return': 'Total Return (%)'}
+                labels={'Volatility': 'Volatility (%)', 'Total Return': 'Total Return (%)'}
             )
             
             fig_scatter.update_traces(
@@ -428,17 +749,15 @@ with tabs[3]:
             # Value at Risk (VaR)
             st.subheader("Value at Risk (VaR) - 95% Confidence")
             
-            var_data = []
-            for ticker, df in stock_data.items():
-                daily_returns = df['Close'].pct_change().dropna()
-                var_95 = np.percentile(daily_returns, 5) * 100
-                var_data.append({
-                    "Ticker": ticker,
-                    "1-Day VaR (95%)": f"{var_95:.2f}%",
-                    "Interpretation": f"5% chance of losing more than {abs(var_95):.2f}% in a day"
-                })
+            # Percentiles for all tickers at once; NaNs pad tickers with shorter histories
+            returns_matrix = pd.concat(returns_by_ticker, axis=1)
+            vars_95 = np.nanpercentile(returns_matrix.to_numpy(dtype=np.float64), 5, axis=0) * 100
             
-            var_df = pd.DataFrame(var_data)
+            var_df = pd.DataFrame({
+                "Ticker": returns_matrix.columns,
+                "1-Day VaR (95%)": [f"{var_95:.2f}%" for var_95 in vars_95],
+                "Interpretation": [f"5% chance of losing more than {abs(var_95):.2f}% in a day" for var_95 in vars_95]
+            })
             st.dataframe(var_df, use_container_width=True, hide_index=True)
 
 # Footer